@@ -18,15 +18,10 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-from flask import Flask
-from debile.master.utils import init_master
-from debileweb.blueprints.frontend import frontend
+from debileweb.core import create_app
 
-app = Flask("debile-web")
-app.config.from_object('config')
-app.register_blueprint(frontend)
+app = create_app()
 
 
 if __name__ == '__main__':
-    init_master(fedmsg=False)
     app.run(debug=False)
@@ -1,2 +1,18 @@
 CSRF_ENABLED = True
 SECRET_KEY = 'that-is_a_secr+et+key'
+
+# Let the front web server send the result files: either through X-Sendfile
+# (Apache mod_xsendfile, lighttpd), or through X-Accel-Redirect (nginx) to an
+# internal location aliasing the results directory X_ACCEL_REDIRECT_ROOT
+# (see PACKAGING). Result files are linked to their public URL otherwise.
+USE_X_SENDFILE = False
+X_ACCEL_REDIRECT_PREFIX = None
+X_ACCEL_REDIRECT_ROOT = None
+
+# Firehose issue index built by `python -m debileweb.firehoseindex <path>`,
+# searched by /_search_issues and /_search_issue_packages.
+FIREHOSE_INDEX = None
+
+# Serve the frontend from a read-only snapshot built and refreshed by
+# `python -m debileweb.snapshot <path>` instead of the master database.
+SNAPSHOT_DATABASE = None
@@ -0,0 +1,175 @@
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Static asset pipeline.
+
+At build time, `build()` copies each asset to a content-hashed name next to
+the original, writes gzip (and, if the brotli module is available, brotli)
+precompressed variants, and records the mapping in a manifest. At run time,
+`init_app()` makes `url_for('static', ...)` resolve the hashed names, serves
+those with far-future cache headers and the best precompressed variant the
+client accepts, and compresses HTML responses on the fly.
+
+    python -m debileweb.assets static css/debile.css
+"""
+
+from flask import request, send_from_directory
+
+from io import BytesIO
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MANIFEST = 'manifest.json'
+
+# Hashed assets never change, so clients may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants, in order of preference.
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+COMPRESSED_MIMETYPES = ['text/html']
+COMPRESS_MIN_SIZE = 512
+COMPRESS_LEVEL = 6
+
+
+def gzip_bytes(data, level=9):
+    buf = BytesIO()
+    # A fixed mtime keeps the output reproducible across builds.
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=level, mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def hashed_name(filename, content):
+    root, ext = os.path.splitext(filename)
+    return "%s.%s%s" % (root, hashlib.md5(content).hexdigest()[:12], ext)
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def build(static_folder, filenames):
+    manifest = load_manifest(static_folder)
+
+    for filename in filenames:
+        with open(os.path.join(static_folder, filename), 'rb') as f:
+            content = f.read()
+
+        name = hashed_name(filename, content)
+        path = os.path.join(static_folder, name)
+        variants = [(path, content), (path + '.gz', gzip_bytes(content))]
+        if brotli is not None:
+            variants.append((path + '.br', brotli.compress(content)))
+        for variant_path, data in variants:
+            with open(variant_path, 'wb') as f:
+                f.write(data)
+
+        manifest[filename] = name
+
+    with open(os.path.join(static_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+    return manifest
+
+
+def send_precompressed(static_folder, filename):
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    for encoding, suffix in PRECOMPRESSED:
+        if not request.accept_encodings[encoding]:
+            continue
+        if not os.path.isfile(os.path.join(static_folder, filename + suffix)):
+            continue
+        response = send_from_directory(static_folder, filename + suffix,
+                                       mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+        response = send_from_directory(static_folder, filename,
+                                       mimetype=mimetype)
+
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def compress_response(response):
+    if (response.status_code != 200 or
+            response.direct_passthrough or
+            response.is_streamed or
+            response.mimetype not in COMPRESSED_MIMETYPES or
+            'Content-Encoding' in response.headers or
+            not request.accept_encodings['gzip']):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip_bytes(data, COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    manifest = load_manifest(app.static_folder)
+    hashed = set(manifest.values())
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        if filename in hashed:
+            return send_precompressed(app.static_folder, filename)
+        return app.send_static_file(filename)
+
+    app.view_functions['static'] = static
+    app.after_request(compress_response)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        sys.exit("Usage: %s <static folder> <file> [<file> ...]" % sys.argv[0])
+
+    manifest = build(argv[0], argv[1:])
+    for filename in argv[1:]:
+        print("%s -> %s" % (filename, manifest[filename]))
+
+
+if __name__ == '__main__':
+    main()
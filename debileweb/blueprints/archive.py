@@ -0,0 +1,105 @@
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from flask import Response, current_app, send_from_directory
+from werkzeug.urls import url_quote
+
+import mimetypes
+import os
+import posixpath
+import tarfile
+import zlib
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def tar_gz(directory, filenames, arcdir):
+    """
+    Generate a .tar.gz archive of the given files of a directory, chunk by
+    chunk, without temporary files nor holding any file in memory.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    length = 0
+
+    for fname in filenames:
+        path = os.path.join(directory, fname)
+        with open(path, 'rb') as f:
+            info = tarfile.TarInfo(posixpath.join(arcdir, fname))
+            info.size = os.fstat(f.fileno()).st_size
+            info.mtime = int(os.fstat(f.fileno()).st_mtime)
+            info.mode = 0o644
+
+            header = info.tobuf(tarfile.GNU_FORMAT)
+            yield compressor.compress(header)
+            length += len(header)
+
+            remaining = info.size
+            while remaining > 0:
+                # Pad with zeros should the file shrink while being read.
+                data = f.read(min(CHUNK_SIZE, remaining)) or \
+                    tarfile.NUL * min(CHUNK_SIZE, remaining)
+                remaining -= len(data)
+                yield compressor.compress(data)
+
+        padding = -info.size % tarfile.BLOCKSIZE
+        yield compressor.compress(tarfile.NUL * padding)
+        length += info.size + padding
+
+    # Two empty blocks end the archive, which is padded to a full record.
+    trailer = 2 * tarfile.BLOCKSIZE
+    trailer += -(length + trailer) % tarfile.RECORDSIZE
+    yield compressor.compress(tarfile.NUL * trailer)
+    yield compressor.flush()
+
+
+def send_archive(directory, arcdir):
+    filenames = sorted(
+        fname for fname in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, fname))
+    )
+    response = Response((x for x in tar_gz(directory, filenames, arcdir) if x),
+                        mimetype='application/x-gzip', direct_passthrough=True)
+    response.headers['Content-Disposition'] = \
+        'attachment; filename="%s.tar.gz"' % arcdir
+    return response
+
+
+def send_file(directory, filename):
+    """
+    Send a file, letting the front web server do it when configured to.
+
+    USE_X_SENDFILE is handled by Flask itself; X_ACCEL_REDIRECT_PREFIX is
+    the nginx internal location X_ACCEL_REDIRECT_ROOT is aliased under.
+    Files outside of X_ACCEL_REDIRECT_ROOT are sent by Flask.
+    """
+    mimetype = mimetypes.guess_type(filename)[0]
+    if mimetype is None and filename.endswith((".log", ".dud")):
+        mimetype = 'text/plain'
+
+    prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    root = current_app.config.get('X_ACCEL_REDIRECT_ROOT')
+    path = os.path.join(os.path.abspath(directory), filename)
+    root = os.path.join(os.path.abspath(root), '') if root else None
+    if prefix and root and path.startswith(root):
+        response = Response(mimetype=mimetype or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = url_quote(
+            prefix.rstrip('/') + '/' + path[len(root):])
+        return response
+
+    return send_from_directory(directory, filename, mimetype=mimetype)
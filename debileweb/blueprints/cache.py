@@ -0,0 +1,108 @@
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from collections import OrderedDict
+from threading import Event, Lock
+import time
+
+
+class LRUCache(object):
+    """A thread-safe mapping that only keeps the `size` most recently used keys."""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = Event()
+        self.value = None
+        self.error = None
+        self.done_at = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent computations of the same key into a single one.
+
+    Callers asking for a key while it is being computed wait for that
+    computation and share its result (or exception). Callers arriving up to
+    `grace` seconds after it completed successfully get its result at once.
+    """
+
+    def __init__(self, grace):
+        self.grace = grace
+        self._calls = {}
+        self._lock = Lock()
+
+    def _expired(self, call, now):
+        return call.done_at is not None and now - call.done_at > self.grace
+
+    def do(self, key, fn):
+        with self._lock:
+            now = time.time()
+            call = self._calls.get(key)
+            leader = call is None or self._expired(call, now)
+            if leader:
+                for k, c in list(self._calls.items()):
+                    if self._expired(c, now):
+                        del self._calls[k]
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            # Including e.g. gevent timeouts or worker shutdowns: waiting
+            # callers must not get a None result.
+            call.error = e
+            raise
+        else:
+            call.done_at = time.time()
+        finally:
+            if call.done_at is None:
+                # Never share a failed computation with later callers.
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+            call.event.set()
+
+        return call.value
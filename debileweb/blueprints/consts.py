@@ -30,3 +30,30 @@ PREFIXES = [
 
 ENTRIES_PER_PAGE = 20
 ENTRIES_PER_LIST_PAGE = 100
+
+# Seconds before read-mostly caches (e.g. the source name index) are reloaded
+CACHE_TIMEOUT = 300
+
+# Maximum number of levels followed when resolving a dep-wait chain
+MAX_DEP_DEPTH = 50
+
+# Number of source packages whose job outcome matrix rows are cached
+MATRIX_CACHE_SIZE = 10000
+
+# Seconds a just rendered listing page is still served to late arrivals
+COALESCE_GRACE = 2
+
+# Number of jobs listed in Atom feeds
+FEED_ENTRIES = 50
+
+# Number of rendered status badges kept in memory
+BADGE_CACHE_SIZE = 10000
+
+# Seconds clients and proxies may cache a status badge
+BADGE_MAX_AGE = 60
+
+# Seconds between checks of the jobs watermark invalidating cached badges
+WATERMARK_INTERVAL = 1
+
+# Number of parsed package versions kept in memory for sorting
+VERSION_KEY_CACHE_SIZE = 10000
@@ -21,22 +21,35 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-from flask import Blueprint, render_template, request, redirect
+from flask import Blueprint, Response, current_app, render_template, request, redirect, abort
 from flask.ext.jsonpify import jsonify
 from debian.debian_support import Version
-from sqlalchemy.sql import func, select, asc
+from sqlalchemy.orm import joinedload, subqueryload
+from sqlalchemy.sql import func, select, asc, case, literal
 
 from debile.master.utils import Session
-from debile.master.orm import (Person, Builder, Suite, Check, Group, GroupSuite,
-                               Source, Maintainer, Job)
+from debile.master.orm import (Person, Builder, Suite, Arch, Check, Group, GroupSuite,
+                               Source, Maintainer, Job, Result)
 
+from debileweb.blueprints.archive import send_archive, send_file
+from debileweb.blueprints.cache import LRUCache, SingleFlight
 from debileweb.blueprints.forms import SearchPackageForm
-from debileweb.blueprints.consts import PREFIXES, ENTRIES_PER_PAGE, ENTRIES_PER_LIST_PAGE
+from debileweb.blueprints.logdiff import diff_logs
+from debileweb import firehoseindex
+from debileweb.blueprints.consts import PREFIXES, ENTRIES_PER_PAGE, ENTRIES_PER_LIST_PAGE, CACHE_TIMEOUT, \
+    MAX_DEP_DEPTH, MATRIX_CACHE_SIZE, COALESCE_GRACE, FEED_ENTRIES, BADGE_CACHE_SIZE, \
+    BADGE_MAX_AGE, WATERMARK_INTERVAL, VERSION_KEY_CACHE_SIZE
 
+from bisect import bisect_left
 from contextlib import contextmanager
 from datetime import datetime
+from functools import wraps
 from humanize import naturaltime
+from itertools import takewhile
+import hashlib
 import os
+import sqlite3
+import time
 
 frontend = Blueprint('frontend', __name__, template_folder='templates')
 
@@ -56,6 +69,333 @@ def session_scope():
         session_.close()
 
 
+# Read-mostly caches shared by all requests of a worker. They fill up lazily,
+# or up front in the master process through debileweb.core.warm_up().
+_version_keys = LRUCache(VERSION_KEY_CACHE_SIZE)
+_source_names = {'names': [], 'loaded_at': None}
+
+# (time, job outcomes) per source id, only for sources whose jobs are all
+# done, reused for CACHE_TIMEOUT seconds in case jobs get rescheduled.
+_matrix_cache = LRUCache(MATRIX_CACHE_SIZE)
+
+# Rendered badges, valid as long as the jobs watermark they were rendered at.
+_badge_cache = LRUCache(BADGE_CACHE_SIZE)
+_jobs_watermark = {'value': None, 'checked_at': 0}
+
+
+def version_key(version):
+    key = _version_keys.get(version)
+    if key is None:
+        key = Version(version)
+        _version_keys.set(version, key)
+    return key
+
+
+def source_names(session):
+    now = time.time()
+    loaded_at = _source_names['loaded_at']
+    if loaded_at is None or now - loaded_at > CACHE_TIMEOUT:
+        query = session.query(
+            Source.name,
+        ).group_by(
+            Source.name,
+        ).order_by(
+            Source.name.asc(),
+        )
+        _source_names['names'] = [r[0] for r in query]
+        _source_names['loaded_at'] = now
+    return _source_names['names']
+
+
+def job_options():
+    # The relations of a job that job_list_fragment.html and job.html use.
+    return [
+        joinedload(Job.source).joinedload(Source.group_suite).joinedload(GroupSuite.group),
+        joinedload(Job.source).joinedload(Source.group_suite).joinedload(GroupSuite.suite),
+        joinedload(Job.check),
+        joinedload(Job.builder),
+        subqueryload(Job.depedencies),
+        subqueryload(Job.built_binaries),
+    ]
+
+
+def dependency_chain(session, job_id):
+    # Walk the (blocked, blocking) pairs of Job.depedencies with a single
+    # recursive query, yielding (job, depth) for every job job_id waits for.
+    deps = Job.depedencies.property
+    blocked = deps.synchronize_pairs[0][1].name
+    blocking = deps.secondary_synchronize_pairs[0][1].name
+
+    link = deps.secondary
+    chain = select([
+        link.c[blocking].label('job_id'),
+        literal(1).label('depth'),
+    ]).where(
+        link.c[blocked] == job_id,
+    ).cte('chain', recursive=True)
+
+    link = link.alias()
+    chain = chain.union(select([
+        link.c[blocking],
+        chain.c.depth + 1,
+    ]).where(
+        (link.c[blocked] == chain.c.job_id) &
+        (chain.c.depth < MAX_DEP_DEPTH)
+    ))
+
+    depths = select([
+        chain.c.job_id,
+        func.min(chain.c.depth).label('depth'),
+    ]).group_by(
+        chain.c.job_id,
+    ).alias('depths')
+
+    return session.query(Job, depths.c.depth).join(
+        depths, Job.id == depths.c.job_id,
+    ).order_by(
+        depths.c.depth.asc(),
+        Job.id.asc(),
+    )
+
+
+def result_info(result):
+    # Sort the files of a result directory, raising OSError if it is gone.
+    resultinfo = {}
+    resultinfo['result'] = result
+    resultinfo['archive_link'] = "/result/%d.tar.gz" % result.id
+    # Single files only go through the web UI when the front web server
+    # sends them on its behalf, they are linked where they are served
+    # otherwise.
+    if current_app.config.get('USE_X_SENDFILE') or \
+            current_app.config.get('X_ACCEL_REDIRECT_PREFIX'):
+        resultinfo['files_link'] = "/result/%d" % result.id
+    else:
+        resultinfo['files_link'] = result.url
+    resultinfo['dud_name'] = None
+    resultinfo['log_name'] = None
+    resultinfo['firehose_name'] = None
+    resultinfo['files'] = []
+    for fname in os.listdir(result.path):
+        if fname.endswith(".dud"):
+            resultinfo['dud_name'] = fname
+        elif fname.endswith(".log"):
+            resultinfo['log_name'] = fname
+        elif fname.endswith(".firehose.xml"):
+            resultinfo['firehose_name'] = fname
+        else:
+            resultinfo['files'] += [fname]
+    return resultinfo
+
+
+def job_outcome(total, assigned, finished, failed, passed):
+    # Summarize the counts of a set of jobs into a single outcome.
+    if failed:
+        return 'failed'
+    elif passed == total:
+        return 'passed'
+    elif finished == total:
+        return 'pending'
+    elif assigned > finished:
+        return 'running'
+    else:
+        return 'queued'
+
+
+def job_outcomes(session, source_ids):
+    # One row per (source, check, arch), summarizing the state of its jobs.
+    query = session.query(
+        Job.source_id,
+        Check.name,
+        Arch.name,
+        func.count(Job.id),
+        func.count(Job.assigned_at),
+        func.count(Job.finished_at),
+        func.sum(case([(Job.failed.is_(True), 1)], else_=0)),
+        func.sum(case([(Job.failed.is_(False), 1)], else_=0)),
+    ).join(Job.check).join(Job.arch).filter(
+        Job.source_id.in_(source_ids),
+    ).group_by(
+        Job.source_id,
+        Check.name,
+        Arch.name,
+    )
+
+    # Also tell which sources have all their jobs finished with results.
+    outcomes = dict((source_id, {}) for source_id in source_ids)
+    done = dict((source_id, True) for source_id in source_ids)
+    for source_id, check, arch, total, assigned, finished, failed, passed in query:
+        outcomes[source_id][(check, arch)] = \
+            job_outcome(total, assigned, finished, failed, passed)
+        if finished != total or failed + passed != total:
+            done[source_id] = False
+    return outcomes, done
+
+
+def job_feed(session, title, link, scope):
+    # Atom feed of the latest finished jobs matching `scope`. Feed readers
+    # polling it only cost two index lookups until a job finishes or one of
+    # its results comes in.
+    last_job = session.query(Job.id, Job.finished_at).filter(
+        Job.finished_at != None,
+        scope,
+    ).order_by(
+        Job.finished_at.desc(),
+        Job.id.desc(),
+    ).first()
+    # Results are uploaded after the job is marked finished and change its
+    # failed state, so they have to move the ETag as well.
+    last_result = session.query(Result.id).join(Result.job).filter(
+        scope,
+    ).order_by(
+        Result.id.desc(),
+    ).limit(1).scalar()
+
+    # Jobs finishing within the same second must still change the ETag, only
+    # Last-Modified is limited to a precision of a second.
+    last_id, last_finished = last_job if last_job else (0, None)
+    etag = "%s-%s-%s" % (last_id, last_result or 0,
+                         last_finished.isoformat() if last_finished else "never")
+    last_modified = last_finished.replace(microsecond=0) if last_finished else None
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and last_modified is not None and \
+            last_modified <= since.replace(tzinfo=None)
+
+    if not_modified:
+        response = Response(status=304)
+    else:
+        jobs = session.query(Job).filter(
+            Job.finished_at != None,
+            scope,
+        ).options(
+            *job_options()
+        ).order_by(
+            Job.finished_at.desc(),
+            Job.id.desc(),
+        ).limit(FEED_ENTRIES).all()
+
+        root = request.url_root.rstrip('/')
+        jobs_info = []
+        for job in jobs:
+            info = {}
+            info['job'] = job
+            info['job_link'] = root + "/job/%s/%s/%s/%s" % \
+                (job.group.name, job.source.name, job.source.version, job.id)
+            jobs_info.append(info)
+
+        info = {}
+        info['title'] = title
+        info['link'] = root + link
+        info['self_link'] = request.base_url
+        info['updated'] = last_modified or datetime.utcfromtimestamp(0)
+
+        response = Response(render_template('feed.xml', **{
+            "info": info,
+            "jobs_info": jobs_info,
+        }), mimetype='application/atom+xml')
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def watermark_fresh():
+    return time.time() - _jobs_watermark['checked_at'] <= WATERMARK_INTERVAL
+
+
+def jobs_watermark(session):
+    # Changes whenever a job is added, assigned, finished or gets a result,
+    # and is only queried again every WATERMARK_INTERVAL seconds.
+    if not watermark_fresh():
+        _jobs_watermark['value'] = session.query(
+            func.max(Job.id),
+            func.max(Job.assigned_at),
+            func.max(Job.finished_at),
+            select([func.max(Result.id)]).as_scalar(),
+        ).one()
+        _jobs_watermark['checked_at'] = time.time()
+    return _jobs_watermark['value']
+
+
+BADGE_STYLES = {
+    'failed': ("failing", "#e05d44"),
+    'passed': ("passing", "#4c1"),
+    'pending': ("upload pending", "#dfb317"),
+    'running': ("running", "#007ec6"),
+    'queued': ("queued", "#9f9f9f"),
+}
+
+
+def render_badge(session, group_name, package_name, check_name):
+    # Outcome of the jobs of the latest version of the package, in one query.
+    latest = session.query(
+        Source.id,
+    ).join(Source.group_suite).join(GroupSuite.group).filter(
+        Group.name == group_name,
+        Source.name == package_name,
+    ).order_by(
+        Source.uploaded_at.desc(),
+    ).limit(1).as_scalar()
+
+    query = session.query(
+        func.count(Job.id),
+        func.count(Job.assigned_at),
+        func.count(Job.finished_at),
+        func.sum(case([(Job.failed.is_(True), 1)], else_=0)),
+        func.sum(case([(Job.failed.is_(False), 1)], else_=0)),
+    ).filter(
+        Job.source_id == latest,
+    )
+    if check_name:
+        query = query.join(Job.check).filter(Check.name == check_name)
+    counts = query.one()
+
+    if counts[0]:
+        value, color = BADGE_STYLES[job_outcome(*counts)]
+    else:
+        value, color = "unknown", "#9f9f9f"
+    label = check_name or "debile"
+
+    # Rough width of the text in 11px Verdana
+    label_width = 7 * len(label) + 10
+    value_width = 7 * len(value) + 10
+
+    svg = render_template('badge.svg', **{
+        "label": label,
+        "value": value,
+        "color": color,
+        "label_width": label_width,
+        "value_width": value_width,
+    })
+    return svg, hashlib.md5(svg.encode('utf-8')).hexdigest()
+
+
+def prime_caches(session):
+    source_names(session)
+    for (version,) in session.query(Source.version).distinct():
+        version_key(version)
+
+
+# Rendered pages of the expensive listings, shared by concurrent requests.
+_flights = SingleFlight(COALESCE_GRACE)
+
+
+def coalesced(view):
+    # Concurrent GET requests for the same page (same route, prefix and
+    # page number) wait for a single rendering of it, instead of all running
+    # the same heavy queries at once.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+        return _flights.do(request.path, lambda: view(*args, **kwargs))
+    return wrapper
+
+
 @frontend.app_template_filter('ago')
 def ago_display(when):
     if when is None:
@@ -64,7 +404,13 @@ def ago_display(when):
     return naturaltime(td)
 
 
+@frontend.app_template_filter('atomdate')
+def atom_date_display(when):
+    return when.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
 @frontend.route("/")
+@coalesced
 def index():
     with session_scope() as session:
         groups = session.query(Group).order_by(
@@ -166,6 +512,7 @@ def index():
 @frontend.route("/sources/")
 @frontend.route("/sources/<prefix>/")
 @frontend.route("/sources/<prefix>/<page>/")
+@coalesced
 def sources(search="", prefix="recent", page=0):
     if request.path == "/maintainer/search/":
         return redirect('/maintainer/' + request.form['maintainer'] + '/')
@@ -297,6 +644,7 @@ def sources(search="", prefix="recent", page=0):
 @frontend.route("/jobs/")
 @frontend.route("/jobs/<prefix>/")
 @frontend.route("/jobs/<prefix>/<page>/")
+@coalesced
 def jobs(prefix="recent", page=0):
     page = int(page)
 
@@ -426,6 +774,7 @@ def group(name, page=0):
 
         info = {}
         info['maintainer_link'] = "/user/%s" % group.maintainer.email
+        info['feed_link'] = "/feed/group/%s/" % group.name
         info['prev_link'] = "/group/%s/%d" % (group.name, page - 1) \
             if page > 0 else None
         info['next_link'] = "/group/%s/%d" % (group.name, page + 1) \
@@ -470,6 +819,7 @@ def builder(name, page=0):
 
         info = {}
         info['maintainer_link'] = "/user/%s" % builder.maintainer.email
+        info['feed_link'] = "/feed/builder/%s/" % builder.name
         info['prev_link'] = "/builder/%s/%d" % (builder.name, page - 1) \
             if page > 0 else None
         info['next_link'] = "/builder/%s/%d" % (builder.name, page + 1) \
@@ -554,6 +904,7 @@ def user(email, page=0):
             sources_info.append(info)
 
         info = {}
+        info['feed_link'] = "/feed/user/%s/" % user.email
         info['prev_link'] = "/user/%s/%d" % (user.email, page - 1) \
             if page > 0 else None
         info['next_link'] = "/user/%s/%d" % (user.email, page + 1) \
@@ -594,7 +945,7 @@ def source(group_name, package_name, suite_or_version):
             Group.name == group_name,
             Source.name == package_name,
         )
-        versions = sorted([x[0] for x in versions], key=Version, reverse=True)
+        versions = sorted([x[0] for x in versions], key=version_key, reverse=True)
 
         versions_info = []
         if len(versions) > 1:
@@ -631,6 +982,9 @@ def source(group_name, package_name, suite_or_version):
         info["job_status"] = (total, unfinished)
         info['group_link'] = "/group/%s" % source.group.name
         info['uploader_link'] = "/user/%s" % source.uploader.email
+        info['matrix_link'] = "/source/%s/%s/matrix/" % (group_name, package_name)
+        info['feed_link'] = "/feed/source/%s/%s/" % (group_name, package_name)
+        info['badge_link'] = "/badge/%s/%s.svg" % (group_name, package_name)
 
         return render_template('source.html', **{
             "source": source,
@@ -640,13 +994,114 @@ def source(group_name, package_name, suite_or_version):
         })
 
 
+@frontend.route("/source/<group_name>/<package_name>/matrix/")
+def source_matrix(group_name, package_name):
+    with session_scope() as session:
+        sources = session.query(
+            Source.id,
+            Source.version,
+        ).join(Source.group_suite).join(GroupSuite.group).filter(
+            Group.name == group_name,
+            Source.name == package_name,
+        ).all()
+
+        if not sources:
+            return render_template('source-not-found.html', **{
+                "group_name": group_name,
+                "package_name": package_name,
+            })
+
+        outcomes = {}
+        for source_id, version in sources:
+            cached = _matrix_cache.get(source_id)
+            if cached is not None and time.time() - cached[0] <= CACHE_TIMEOUT:
+                outcomes[source_id] = cached[1]
+
+        missing = [source_id for source_id, version in sources
+                   if source_id not in outcomes]
+        if missing:
+            cells, done = job_outcomes(session, missing)
+            for source_id in missing:
+                outcomes[source_id] = cells[source_id]
+                if cells[source_id] and done[source_id]:
+                    _matrix_cache.set(source_id, (time.time(), cells[source_id]))
+
+        columns = sorted(set(column for cells in outcomes.values() for column in cells))
+
+        rows = []
+        for source_id, version in sorted(sources, key=lambda x: version_key(x[1]), reverse=True):
+            href = "/source/%s/%s/%s" % (group_name, package_name, version)
+            rows.append((version, href, outcomes[source_id]))
+
+        return render_template('source_matrix.html', **{
+            "group_name": group_name,
+            "package_name": package_name,
+            "columns": columns,
+            "rows": rows,
+        })
+
+
+@frontend.route("/feed/group/<name>/")
+def group_feed(name):
+    with session_scope() as session:
+        return job_feed(
+            session, "Jobs of package group %s" % name, "/group/%s/" % name,
+            Job.source.has(Source.group_suite.has(GroupSuite.group.has(
+                Group.name == name,
+            ))),
+        )
+
+
+@frontend.route("/feed/user/<email>/")
+def user_feed(email):
+    with session_scope() as session:
+        return job_feed(
+            session, "Jobs of packages of %s" % email, "/user/%s/" % email,
+            Job.source.has(
+                Source.uploader.has(Person.email == email) |
+                Source.maintainers.any(Maintainer.email == email)
+            ),
+        )
+
+
+@frontend.route("/feed/builder/<name>/")
+def builder_feed(name):
+    with session_scope() as session:
+        return job_feed(
+            session, "Jobs built by %s" % name, "/builder/%s" % name,
+            Job.builder.has(Builder.name == name),
+        )
+
+
+@frontend.route("/feed/source/<group_name>/<package_name>/")
+def source_feed(group_name, package_name):
+    with session_scope() as session:
+        return job_feed(
+            session, "Jobs of %s in %s" % (package_name, group_name),
+            "/source/%s/%s/matrix/" % (group_name, package_name),
+            Job.source.has(
+                (Source.name == package_name) &
+                Source.group_suite.has(GroupSuite.group.has(
+                    Group.name == group_name,
+                ))
+            ),
+        )
+
+
 @frontend.route("/job/<job_id>/")
 @frontend.route("/job/<group_name>/<package_name>/<package_version>/<job_id>/")
 def job(job_id, group_name="", package_name="", package_version="", version=""):
     job_id = int(job_id)
 
     with session_scope() as session:
-        job = session.query(Job).get(job_id)
+        job = session.query(Job).options(
+            joinedload(Job.binary),
+            joinedload(Job.component),
+            joinedload(Job.arch),
+            subqueryload(Job.depedencies).joinedload(Job.source).joinedload(Source.group_suite).joinedload(GroupSuite.group),
+            subqueryload(Job.results),
+            *job_options()
+        ).get(job_id)
 
         info = {}
         info['group_link'] = "/group/%s" % job.group.name
@@ -656,6 +1111,7 @@ def job(job_id, group_name="", package_name="", package_version="", version=""):
             (job.group.name, job.binary.name, job.binary.version, job.binary.build_job_id) \
             if (job.binary and job.binary.build_job_id) else None
         info['builder_link'] = "/builder/%s" % job.builder.name if job.builder else None
+        info['deps_link'] = "/job/%d/deps/" % job.id
 
         info['job_runtime'] = None
         if job.finished_at and job.assigned_at:
@@ -678,22 +1134,7 @@ def job(job_id, group_name="", package_name="", package_version="", version=""):
         results_info = []
         for result in job.results:
             try:
-                resultinfo = {}
-                resultinfo['result'] = result
-                resultinfo['dud_name'] = None
-                resultinfo['log_name'] = None
-                resultinfo['firehose_name'] = None
-                resultinfo['files'] = []
-                for fname in os.listdir(result.path):
-                    if fname.endswith(".dud"):
-                        resultinfo['dud_name'] = fname
-                    elif fname.endswith(".log"):
-                        resultinfo['log_name'] = fname
-                    elif fname.endswith(".firehose.xml"):
-                        resultinfo['firehose_name'] = fname
-                    else:
-                        resultinfo['files'] += [fname]
-                results_info.append(resultinfo)
+                results_info.append(result_info(result))
             except OSError:
                 pass
 
@@ -705,19 +1146,141 @@ def job(job_id, group_name="", package_name="", package_version="", version=""):
         })
 
 
+@frontend.route("/job/<job_id>/deps/")
+def job_deps(job_id):
+    job_id = int(job_id)
+
+    with session_scope() as session:
+        job = session.query(Job).get(job_id)
+        if job is None:
+            abort(404)
+
+        jobs_info = []
+        for dep, depth in dependency_chain(session, job_id).options(*job_options()):
+            info = {}
+            info['job'] = dep
+            info['depth'] = depth
+            info['job_link'] = "/job/%s/%s/%s/%s" % \
+                (dep.group.name, dep.source.name, dep.source.version, dep.id)
+            info['source_link'] = "/source/%s/%s/%s" % \
+                (dep.group.name, dep.source.name, dep.source.version)
+            info['group_link'] = "/group/%s" % dep.group.name
+            info['builder_link'] = "/builder/%s" % dep.builder.name \
+                if dep.builder else None
+            jobs_info.append(info)
+
+        info = {}
+        info['desc'] = "All jobs %s/%s %s is waiting for, directly or not." % \
+            (job.source.name, job.source.version, job.name)
+
+        return render_template('jobs.html', **{
+            "info": info,
+            "jobs_info": jobs_info,
+            "show_depth": True,
+        })
+
+
+@frontend.route("/diff/<job_a>/<job_b>/")
+def log_diff(job_a, job_b):
+    logs = []
+    with session_scope() as session:
+        for job_id in (int(job_a), int(job_b)):
+            job = session.query(Job).options(
+                joinedload(Job.source),
+                subqueryload(Job.results),
+            ).get(job_id)
+            if job is None:
+                abort(404)
+
+            # Use the log of the most recent result still on disk.
+            path = None
+            for result in sorted(job.results, key=lambda x: x.id, reverse=True):
+                try:
+                    info = result_info(result)
+                except OSError:
+                    continue
+                if info['log_name']:
+                    path = os.path.join(result.path, info['log_name'])
+                    break
+            if path is None:
+                abort(404)
+
+            logs.append((path, job.source.version))
+
+    (path_a, version_a), (path_b, version_b) = logs
+    return Response(diff_logs(path_a, path_b, version_a, version_b),
+                    mimetype='text/plain')
+
+
+@frontend.route("/result/<result_id>.tar.gz")
+def result_archive(result_id):
+    with session_scope() as session:
+        result = session.query(Result).get(int(result_id))
+        if result is None:
+            abort(404)
+        directory = result.path
+        arcdir = "%s_%s_%d" % \
+            (result.job.source.name, result.job.source.version, result.id)
+
+    try:
+        return send_archive(directory, arcdir)
+    except OSError:
+        abort(404)
+
+
+@frontend.route("/result/<result_id>/<filename>")
+def result_file(result_id, filename):
+    with session_scope() as session:
+        result = session.query(Result).get(int(result_id))
+        if result is None:
+            abort(404)
+        directory = result.path
+
+    try:
+        if filename not in os.listdir(directory):
+            abort(404)
+    except OSError:
+        abort(404)
+
+    return send_file(directory, filename)
+
+
+@frontend.route("/badge/<group_name>/<package_name>.svg")
+@frontend.route("/badge/<group_name>/<package_name>/<check_name>.svg")
+def badge(group_name, package_name, check_name=None):
+    key = (group_name, package_name, check_name)
+    cached = _badge_cache.get(key)
+
+    if cached is None or not watermark_fresh() or \
+            cached[0] != _jobs_watermark['value']:
+        with session_scope() as session:
+            watermark = jobs_watermark(session)
+            if cached is None or cached[0] != watermark:
+                cached = (watermark,) + render_badge(
+                    session, group_name, package_name, check_name)
+                _badge_cache.set(key, cached)
+
+    watermark, svg, etag = cached
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(svg, mimetype='image/svg+xml')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=%d' % BADGE_MAX_AGE
+    return response
+
+
 @frontend.route('/_search_source')
 def search_source():
     with session_scope() as session:
         search = request.args.get('search[term]')
+        if not search:
+            return jsonify([])
 
-        query = session.query(
-            Source.name,
-        ).filter(
-            Source.name.startswith(search),
-        ).group_by(
-            Source.name,
-        ).limit(10).all()
-        result = [r[0] for r in query]
+        names = source_names(session)
+        start = bisect_left(names, search)
+        result = list(takewhile(lambda name: name.startswith(search),
+                                names[start:start + 10]))
 
         return jsonify(result)
 
@@ -742,6 +1305,69 @@ def search_maintainer():
         return jsonify(result)
 
 
+@contextmanager
+def firehose_index():
+    path = current_app.config.get('FIREHOSE_INDEX')
+    if not path or not os.path.exists(path):
+        abort(404)
+
+    db = sqlite3.connect(path)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@frontend.route('/_search_issues')
+def search_issues():
+    filters = request.args
+    if not any(filters.get(x) for x in firehoseindex.FILTERS):
+        abort(400)
+    page = int(request.args.get('page', 0))
+
+    with firehose_index() as db:
+        rows = firehoseindex.search_issues(
+            db, filters, ENTRIES_PER_LIST_PAGE, page * ENTRIES_PER_LIST_PAGE,
+        )
+
+    result = []
+    for job_id, group_name, source, version, generator, testid, severity, fname, line, message in rows:
+        result.append({
+            "job_link": "/job/%s/%s/%s/%d" % (group_name, source, version, job_id),
+            "source": source,
+            "version": version,
+            "generator": generator,
+            "testid": testid,
+            "severity": severity,
+            "file": fname,
+            "line": line,
+            "message": message,
+        })
+
+    return jsonify(result)
+
+
+@frontend.route('/_search_issue_packages')
+def search_issue_packages():
+    filters = request.args
+    if not any(filters.get(x) for x in firehoseindex.FILTERS):
+        abort(400)
+
+    with firehose_index() as db:
+        rows = firehoseindex.search_packages(db, filters)
+
+    result = []
+    for group_name, source, count in rows:
+        result.append({
+            "matrix_link": "/source/%s/%s/matrix/" % (group_name, source),
+            "group": group_name,
+            "source": source,
+            "issues": count,
+        })
+
+    return jsonify(result)
+
+
 @frontend.route('/about')
 def about():
     return render_template('about.html')
@@ -0,0 +1,193 @@
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Unified diff of two (possibly huge) build logs in bounded memory.
+
+Both logs are read lazily. Lines are compared by the hash of their
+normalized form (timestamps, build paths and versions masked out), and only
+`window` lines of each log are matched against each other at a time: after
+each round the matched part is emitted and the diff resynchronizes on the
+last common line. Hunks are flushed after `max_hunk` lines.
+"""
+
+from difflib import SequenceMatcher
+from collections import deque
+import io
+import os
+import re
+
+
+NORMALIZERS = [
+    # 2014-05-01 12:34:56.789+0200, 2014-05-01T12:34:56Z
+    (re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:?\d{2})?'), '<date>'),
+    # Thu, 01 May 2014 12:34:56 +0200
+    (re.compile(r'\w{3}, \d{1,2} \w{3} \d{4} \d{2}:\d{2}:\d{2}( [+-]\d{4})?'), '<date>'),
+    (re.compile(r'\b\d{2}:\d{2}:\d{2}(\.\d+)?\b'), '<time>'),
+    # sbuild/pbuilder build directories and mktemp names
+    (re.compile(r'/(build|tmp)/[\w.+~-]+'), r'/\1/<dir>'),
+    (re.compile(r'\b0x[0-9a-fA-F]{6,}\b'), '<addr>'),
+]
+
+
+def version_normalizers(version):
+    # The full version and its upstream part (without epoch nor revision),
+    # not as part of a longer word or number (foo_1.0-1_amd64.deb matches,
+    # 11.05 or 1.0.1 do not), and ignoring upstream versions such as "2"
+    # which would match about any number.
+    upstream = version.split(':', 1)[-1].rsplit('-', 1)[0]
+    versions = [version]
+    if len(upstream) >= 3 and not upstream.isdigit():
+        versions.append(upstream)
+    return [(re.compile(r'(?<![A-Za-z0-9.~+])%s(?![A-Za-z0-9~+]|\.\d)' % re.escape(x)),
+             '<version>')
+            for x in sorted(set(versions), key=len, reverse=True)]
+
+
+def normalize(line, normalizers):
+    for regex, replacement in normalizers:
+        line = regex.sub(replacement, line)
+    return line
+
+
+def read_log(path, normalizers):
+    with io.open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            yield hash(normalize(line, normalizers)), line
+
+
+def diff_opcodes(a, b, window):
+    """
+    Yield (tag, a_lines, b_lines) for two iterables of (key, line), where tag
+    is one of 'equal', 'delete', 'insert' or 'replace'.
+    """
+    a, b = iter(a), iter(b)
+    wa, wb = [], []
+    while True:
+        wa.extend(x for _, x in zip(range(window - len(wa)), a))
+        wb.extend(x for _, x in zip(range(window - len(wb)), b))
+        if not wa and not wb:
+            return
+        # Both windows are only partly filled once both logs are exhausted.
+        last = len(wa) < window and len(wb) < window
+
+        matcher = SequenceMatcher(None, [k for k, _ in wa], [k for k, _ in wb],
+                                  autojunk=False)
+        blocks = matcher.get_matching_blocks()[:-1]
+        if last:
+            cut_a, cut_b = len(wa), len(wb)
+        elif blocks:
+            # Only trust the windows up to their last common line, the rest
+            # may match lines which are not read yet.
+            cut_a = blocks[-1][0] + blocks[-1][2]
+            cut_b = blocks[-1][1] + blocks[-1][2]
+        else:
+            cut_a, cut_b = len(wa), len(wb)
+
+        if blocks or last:
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if i2 > cut_a or j2 > cut_b:
+                    break
+                yield tag, [x for _, x in wa[i1:i2]], [x for _, x in wb[j1:j2]]
+        else:
+            yield 'replace', [x for _, x in wa], [x for _, x in wb]
+
+        del wa[:cut_a]
+        del wb[:cut_b]
+
+
+def _hunk_range(start, count):
+    if count == 0:
+        start -= 1
+    return "%d,%d" % (start, count)
+
+
+class _Hunk(object):
+    def __init__(self, context, la, lb):
+        self.lines = [' ' + x for x in context]
+        self.start_a = la - len(context)
+        self.start_b = lb - len(context)
+        self.tail = 0  # Unchanged lines since the last change
+
+    def add(self, line):
+        self.lines.append(line)
+        self.tail = self.tail + 1 if line[0] == ' ' else 0
+
+    def format(self, trim=0):
+        lines = self.lines[:len(self.lines) - trim]
+        count_a = sum(1 for x in lines if x[0] != '+')
+        count_b = sum(1 for x in lines if x[0] != '-')
+        yield "@@ -%s +%s @@\n" % (_hunk_range(self.start_a, count_a),
+                                   _hunk_range(self.start_b, count_b))
+        for line in lines:
+            yield line + "\n"
+
+
+def unified_diff(opcodes, name_a, name_b, context=3, max_hunk=10000):
+    """Format opcodes from diff_opcodes() as a unified diff, line by line."""
+    yield "--- %s\n" % name_a
+    yield "+++ %s\n" % name_b
+
+    la, lb = 1, 1
+    before = deque(maxlen=context)
+    hunk = None
+
+    for tag, a_lines, b_lines in opcodes:
+        if tag == 'equal':
+            for line in a_lines:
+                if hunk is None:
+                    before.append(line)
+                elif hunk.tail < 2 * context:
+                    hunk.add(' ' + line)
+                else:
+                    # Far enough from the next change, close the hunk and
+                    # keep its trailing lines as context of the next one.
+                    before.extend(x[1:] for x in hunk.lines[len(hunk.lines) - context:])
+                    before.append(line)
+                    for x in hunk.format(context):
+                        yield x
+                    hunk = None
+                la += 1
+                lb += 1
+            continue
+
+        for line in ['-' + x for x in a_lines] + ['+' + x for x in b_lines]:
+            if hunk is None:
+                hunk = _Hunk(before, la, lb)
+                before.clear()
+            hunk.add(line)
+            if line[0] == '-':
+                la += 1
+            else:
+                lb += 1
+            if len(hunk.lines) >= max_hunk:
+                for x in hunk.format():
+                    yield x
+                hunk = None
+
+    if hunk is not None:
+        for x in hunk.format(max(hunk.tail - context, 0)):
+            yield x
+
+
+def diff_logs(path_a, path_b, version_a, version_b, window=2000):
+    a = read_log(path_a, NORMALIZERS + version_normalizers(version_a))
+    b = read_log(path_b, NORMALIZERS + version_normalizers(version_b))
+    return unified_diff(diff_opcodes(a, b, window),
+                        os.path.basename(path_a), os.path.basename(path_b))
@@ -17,3 +17,44 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
+
+from flask import Flask
+from sqlalchemy.orm import configure_mappers
+from debile.master.utils import init_master, Session
+
+from debileweb import assets, snapshot
+from debileweb.blueprints.frontend import frontend, session_scope, prime_caches
+
+
+def create_app(config='config'):
+    app = Flask("debile-web")
+    app.config.from_object(config)
+    app.register_blueprint(frontend)
+    assets.init_app(app)
+    init_master(fedmsg=False)
+
+    if app.config.get('SNAPSHOT_DATABASE'):
+        Session.configure(bind=snapshot.snapshot_engine(app.config['SNAPSHOT_DATABASE']))
+
+    return app
+
+
+def warm_up(app):
+    """
+    Do the work every worker would otherwise do on its first requests.
+
+    Meant to run once in the master process before it forks its workers
+    (e.g. `gunicorn --preload wsgi:app`), so that they all share the
+    configured mappers, compiled templates and primed caches copy-on-write.
+    """
+    configure_mappers()
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    with session_scope() as session:
+        prime_caches(session)
+        engine = session.get_bind()
+
+    # Forked workers must not share the master's pooled connections.
+    engine.dispose()
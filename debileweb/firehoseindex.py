@@ -0,0 +1,240 @@
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Archive-wide index of the issues found in the firehose reports of all jobs.
+
+The index is a local sqlite database, updated offline and incrementally:
+only the reports of results added since the previous run are parsed. A full
+sweep walks all results, reindexing reports which changed or were missed
+and dropping the ones which disappeared.
+
+    python -m debileweb.firehoseindex [--full] /var/lib/debile/firehose-index.sqlite
+"""
+
+from sqlalchemy.orm import joinedload
+from firehose.model import Analysis, Issue
+
+from debile.master.utils import init_master, Session
+from debile.master.orm import GroupSuite, Source, Job, Result
+
+import os
+import sqlite3
+import sys
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    path TEXT PRIMARY KEY,
+    result_id INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    path TEXT NOT NULL,
+    result_id INTEGER NOT NULL,
+    job_id INTEGER NOT NULL,
+    group_name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    version TEXT NOT NULL,
+    generator TEXT,
+    testid TEXT,
+    severity TEXT,
+    file TEXT,
+    line INTEGER,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_issues_generator ON issues (generator, testid);
+CREATE INDEX IF NOT EXISTS ix_issues_testid ON issues (testid);
+CREATE INDEX IF NOT EXISTS ix_issues_severity ON issues (severity);
+CREATE INDEX IF NOT EXISTS ix_issues_file ON issues (file);
+CREATE INDEX IF NOT EXISTS ix_issues_path ON issues (path);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+FILTERS = ['generator', 'testid', 'severity', 'file']
+
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+
+def parse_report(path):
+    with open(path, 'rb') as f:
+        analysis = Analysis.from_xml(f)
+
+    generator = analysis.metadata.generator.name
+    for result in analysis.results:
+        if not isinstance(result, Issue):
+            continue
+
+        filename, line = None, None
+        location = result.location
+        if location is not None:
+            if location.file is not None:
+                filename = location.file.givenpath
+            if location.point is not None:
+                line = location.point.line
+            elif location.range is not None:
+                line = location.range.start.line
+
+        message = result.message.text if result.message else None
+        yield generator, result.testid, result.severity, filename, line, message
+
+
+def index_report(db, path, result, stat):
+    job = result.job
+    with db:
+        db.execute("DELETE FROM issues WHERE path = ?", (path,))
+        db.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?)",
+                   (path, result.id, stat.st_mtime, stat.st_size))
+        db.executemany(
+            "INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((path, result.id, job.id, job.group.name, job.source.name,
+              job.source.version) + issue for issue in parse_report(path)),
+        )
+
+
+def index_result(db, result, known, seen, skipped):
+    # Index the changed firehose reports of a result, returning their count.
+    try:
+        fnames = os.listdir(result.path)
+    except OSError:
+        return 0
+
+    updated = 0
+    for fname in fnames:
+        if not fname.endswith(".firehose.xml"):
+            continue
+        path = os.path.join(result.path, fname)
+        seen.add(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if known.get(path) == (stat.st_mtime, stat.st_size):
+            continue
+
+        try:
+            index_report(db, path, result, stat)
+            updated += 1
+        except Exception as e:
+            skipped.append((path, e))
+    return updated
+
+
+def update_index(session, db, full=False):
+    """
+    Index the reports of the results added since the previous run, or of
+    all results for a full sweep, which also reindexes changed reports and
+    drops the ones which disappeared. Returns the number of reports
+    indexed, the number removed and the (path, error) pairs of the reports
+    which could not be parsed.
+    """
+    watermark = db.execute(
+        "SELECT value FROM meta WHERE key = 'max_result_id'").fetchone()
+    watermark = watermark[0] if watermark and not full else 0
+
+    if full:
+        known = dict(
+            (path, (mtime, size))
+            for path, mtime, size in db.execute("SELECT path, mtime, size FROM reports")
+        )
+    else:
+        known = {}
+    seen = set()
+    skipped = []
+    updated = 0
+    max_result_id = watermark
+
+    results = session.query(Result).options(
+        joinedload(Result.job).joinedload(Job.source).joinedload(Source.group_suite).joinedload(GroupSuite.group),
+    ).filter(
+        Result.id > watermark,
+    ).order_by(
+        Result.id.asc(),
+    ).yield_per(1000)
+
+    for result in results:
+        updated += index_result(db, result, known, seen, skipped)
+        max_result_id = result.id
+
+    removed = set(known) - seen
+    with db:
+        for path in removed:
+            db.execute("DELETE FROM issues WHERE path = ?", (path,))
+            db.execute("DELETE FROM reports WHERE path = ?", (path,))
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('max_result_id', ?)",
+                   (max_result_id,))
+
+    return updated, len(removed), skipped
+
+
+def _where(filters):
+    columns = [x for x in FILTERS if filters.get(x)]
+    clause = " AND ".join("%s = ?" % x for x in columns)
+    return clause, [filters[x] for x in columns]
+
+
+def search_issues(db, filters, limit, offset=0):
+    clause, params = _where(filters)
+    return db.execute(
+        "SELECT job_id, group_name, source, version, generator, testid, "
+        "severity, file, line, message FROM issues WHERE %s "
+        "ORDER BY source, version, file, line LIMIT ? OFFSET ?" % clause,
+        params + [limit, offset],
+    ).fetchall()
+
+
+def search_packages(db, filters):
+    clause, params = _where(filters)
+    return db.execute(
+        "SELECT group_name, source, COUNT(*) FROM issues WHERE %s "
+        "GROUP BY group_name, source ORDER BY source, group_name" % clause,
+        params,
+    ).fetchall()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    full = "--full" in argv
+    args = [x for x in argv if x != "--full"]
+    if len(args) != 1:
+        sys.exit("Usage: %s [--full] <index database>" % sys.argv[0])
+
+    init_master(fedmsg=False)
+    session = Session()
+    db = connect(args[0])
+    try:
+        updated, removed, skipped = update_index(session, db, full)
+    finally:
+        db.close()
+        session.close()
+
+    for path, error in skipped:
+        print("Skipping %s: %s" % (path, error))
+    print("%d reports indexed, %d removed" % (updated, removed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+"""
+Read-only snapshot of the tables the frontend reads, in a local sqlite file.
+
+`export()` builds the snapshot in a temporary file next to the previous one
+and atomically renames it over it, skipping the run while another export
+holds the lock file. Unless a full export is requested, it
+starts from a copy of the previous snapshot and only copies jobs added or
+left unfinished since, and rows added to append-only tables (with an overlap
+for late commits), recopying the small tables. With SNAPSHOT_DATABASE set,
+the frontend reads from the snapshot only, so that it no longer competes
+with job dispatching.
+
+    python -m debileweb.snapshot [--full] /var/lib/debile/snapshot.sqlite
+"""
+
+from sqlalchemy import create_engine, event, MetaData, Table, Column
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql import func, select
+
+from debile.master.utils import init_master, Session
+from debile.master.orm import (Person, Builder, Suite, Component, Arch, Check, Group,
+                               GroupSuite, Source, Maintainer, Binary, Deb, Job, Result)
+
+import fcntl
+import os
+import shutil
+import sys
+import tempfile
+
+
+SNAPSHOT_CLASSES = [
+    Person, Builder, Suite, Component, Arch, Check, Group, GroupSuite,
+    Source, Maintainer, Binary, Deb, Job, Result,
+]
+
+# Rows of these are never updated once inserted, only new ids are copied.
+APPEND_ONLY_CLASSES = [Source, Maintainer, Binary, Deb, Result]
+
+# Columns the frontend filters or sorts on.
+INDEXED_COLUMNS = [
+    Source.name, Source.uploaded_at, Source.group_suite_id,
+    Maintainer.source_id, Maintainer.email,
+    Job.source_id, Job.builder_id, Job.assigned_at, Job.finished_at,
+    Result.job_id,
+]
+
+BATCH_SIZE = 1000
+
+# Ids are assigned on insert but committed in any order, so rows committed
+# late with an id below the previous maximum are caught by recopying the
+# last ID_OVERLAP ids of each table on every run.
+ID_OVERLAP = 1000
+MMAP_SIZE = 1024 * 1024 * 1024
+
+
+def snapshot_tables():
+    tables = set()
+    for cls in SNAPSHOT_CLASSES:
+        mapper = class_mapper(cls)
+        tables.add(mapper.local_table)
+        for rel in mapper.relationships:
+            if rel.secondary is not None and rel.mapper.class_ in SNAPSHOT_CLASSES:
+                tables.add(rel.secondary)
+    return sorted(tables, key=lambda x: x.name)
+
+
+def snapshot_schema(tables):
+    # Same tables and columns, but without constraints referring to tables
+    # which are not part of the snapshot.
+    metadata = MetaData()
+    for table in tables:
+        Table(table.name, metadata, *[
+            Column(c.name, c.type, primary_key=c.primary_key)
+            for c in table.columns
+        ])
+    return metadata
+
+
+def copy_rows(src, dst, table, whereclause=None):
+    query = table.select()
+    if whereclause is not None:
+        query = query.where(whereclause)
+
+    insert = table.insert().prefix_with("OR REPLACE")
+    rows = src.execute(query)
+    copied = 0
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if not batch:
+            return copied
+        dst.execute(insert, [dict(row) for row in batch])
+        copied += len(batch)
+
+
+def new_rows(dst, table):
+    last = dst.execute(select([func.max(table.c.id)])).scalar() or 0
+    return table.c.id > last - ID_OVERLAP
+
+
+def update_jobs(src, dst, table):
+    # Jobs still running or waiting for their results may have changed.
+    pending = [r[0] for r in dst.execute(select([table.c.id]).where(
+        (table.c.finished_at == None) | (table.c.failed == None)
+    ))]
+    copied = 0
+    for i in range(0, len(pending), BATCH_SIZE):
+        copied += copy_rows(src, dst, table, table.c.id.in_(pending[i:i + BATCH_SIZE]))
+    return copied + copy_rows(src, dst, table, new_rows(dst, table))
+
+
+def export(src_engine, path, full=False):
+    # Overlapping runs (a slow full export and the next cron run) would
+    # race on the snapshot, skip the run instead when the lock is taken.
+    lock = open(path + ".lock", "a")
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return None
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            # mkstemp only lets its owner read the file.
+            os.chmod(tmp, 0o644)
+            if not full and os.path.exists(path):
+                shutil.copyfile(path, tmp)
+            copied = export_to(src_engine, tmp)
+            os.rename(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return copied
+    finally:
+        lock.close()
+
+
+def export_to(src_engine, tmp):
+    tables = snapshot_tables()
+    dst_engine = create_engine("sqlite:///%s" % tmp, poolclass=NullPool)
+    snapshot_schema(tables).create_all(dst_engine)
+
+    append_only = [class_mapper(x).local_table for x in APPEND_ONLY_CLASSES]
+    jobs = class_mapper(Job).local_table
+
+    src = src_engine.connect()
+    if src_engine.dialect.name == 'postgresql':
+        # Copy all tables from the same point in time.
+        src = src.execution_options(isolation_level='REPEATABLE READ')
+
+    copied = {}
+    try:
+        with src.begin(), dst_engine.begin() as dst:
+            for table in tables:
+                if table is jobs:
+                    copied[table.name] = update_jobs(src, dst, table)
+                elif table in append_only:
+                    copied[table.name] = copy_rows(src, dst, table, new_rows(dst, table))
+                else:
+                    dst.execute(table.delete())
+                    copied[table.name] = copy_rows(src, dst, table)
+
+            for column in INDEXED_COLUMNS:
+                column = column.property.columns[0]
+                dst.execute("CREATE INDEX IF NOT EXISTS ix_%s_%s ON %s (%s)" % (
+                    column.table.name, column.name, column.table.name, column.name))
+
+        with dst_engine.connect() as dst:
+            dst.execute("ANALYZE")
+    finally:
+        src.close()
+        dst_engine.dispose()
+
+    return copied
+
+
+def snapshot_engine(path):
+    engine = create_engine("sqlite:///%s" % path, poolclass=NullPool)
+
+    @event.listens_for(engine, 'connect')
+    def read_only(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA query_only = ON")
+        dbapi_connection.execute("PRAGMA mmap_size = %d" % MMAP_SIZE)
+
+    return engine
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    full = "--full" in argv
+    args = [x for x in argv if x != "--full"]
+    if len(args) != 1:
+        sys.exit("Usage: %s [--full] <snapshot database>" % sys.argv[0])
+
+    init_master(fedmsg=False)
+    session = Session()
+    try:
+        copied = export(session.get_bind(), args[0], full)
+    finally:
+        session.close()
+
+    if copied is None:
+        print("%s: another export is running, skipped" % args[0])
+        return
+    for name in sorted(copied):
+        print("%s: %d rows copied" % (name, copied[name]))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,11 +18,7 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-from flask import Flask
-from debile.master.utils import init_master
-from debileweb.blueprints.frontend import frontend
+from debileweb.core import create_app, warm_up
 
-app = Flask("debile-web")
-app.config.from_object('config')
-app.register_blueprint(frontend)
-init_master(fedmsg=False)
+app = create_app()
+warm_up(app)